@@ -1,18 +1,46 @@
 # src/config.py
 
-import json
+import atexit
+import os
+from contextlib import contextmanager
 from pathlib import Path
 
+from src.utils import json_dumps, json_loads, write_file_bytes
+
 class AppConfig:
+    _instances: dict = {} # Resolved config path -> shared AppConfig, see instance()
+
     def __init__(self, config_file: Path | str = 'config.json'):
         self.config_file = Path(config_file)
-        self._settings = self._load_config()
+        self._raw = self._load_config() # Parsed on first access, see _ensure_parsed
+        self._settings: dict = {}
+        self._fully_parsed = False
+        self._dirty = False # True when _settings has changes not yet written to disk
 
-    def _load_config(self) -> dict:
-        if self.config_file.exists():
-            with open(self.config_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+    @classmethod
+    def instance(cls, config_file: Path | str = 'config.json') -> "AppConfig":
+        """
+        Returns the process-wide AppConfig for config_file, creating it on first use.
+        Prefer this over constructing AppConfig directly so the file is only read once.
+        Shared configs flush any unsaved changes at exit; directly constructed ones must call flush().
+        """
+        key = Path(config_file).resolve()
+        config = cls._instances.get(key)
+        if config is None:
+            config = cls._instances[key] = cls(config_file)
+            atexit.register(config.flush)
+        return config
+
+    def _load_config(self) -> bytes:
+        """Reads the raw config file, writing the defaults first if it is missing or empty."""
+        try:
+            data = self.config_file.read_bytes()
+        except FileNotFoundError:
+            data = b""
+        if data.strip():
+            return data
         else:
+            # Missing or empty config file: start from the defaults
             default_settings = {
                 "output_directory": "./output_bs_maps",
                 "difficulty_mapping": {
@@ -22,41 +50,125 @@ class AppConfig:
                     "3": "Hard",
                     "4": "Expert",
                     "5": "Expert",
-                    "6": "Expert+"
+                    "6": "ExpertPlus"
                 },
                 "audio_target_format": "ogg", # or "wav"
                 "delete_temp_files": True,
+                "temp_directory": "", # Where songs are extracted; empty uses the system temp directory
+                "pretty_json": False, # Indent the generated .dat files (larger, slower to write)
             }
             # Ensure the output directory exists
             output_dir = Path(default_settings["output_directory"])
             output_dir.mkdir(parents=True, exist_ok=True)
-            
-            self._save_config(default_settings)
-            return default_settings
 
-    def _save_config(self, settings: dict):
-        with open(self.config_file, 'w', encoding='utf-8') as f:
-            json.dump(settings, f, indent=4)
+            return self._save_config(default_settings)
+
+    def _ensure_parsed(self) -> dict:
+        """Parses the raw config bytes on first use and returns the settings dict."""
+        if not self._fully_parsed:
+            self._settings = json_loads(self._raw)
+            self._raw = None
+            self._fully_parsed = True
+            self._refresh_cached_settings()
+        return self._settings
+
+    def _refresh_cached_settings(self):
+        """Recomputes the values served by the properties below. Call after any change to _settings."""
+        self._difficulty_mapping = self._settings.get("difficulty_mapping", {})
+        # Same mapping as a tuple indexed by the numeric CH difficulty, for difficulty_name()
+        levels = [int(k) for k in self._difficulty_mapping if str(k).isdigit()]
+        self._difficulty_tuple = tuple(self._difficulty_mapping.get(str(i), "") for i in range(max(levels, default=-1) + 1))
+        self._output_directory = Path(self._settings.get("output_directory", "./output_bs_maps"))
+        self._audio_target_format = self._settings.get("audio_target_format", "ogg")
+        self._delete_temp_files = self._settings.get("delete_temp_files", True)
+        temp_directory = self._settings.get("temp_directory")
+        self._temp_directory = Path(temp_directory) if temp_directory else None
+        self._pretty_json = self._settings.get("pretty_json", False)
+
+    def _save_config(self, settings: dict, durable: bool = False) -> bytes:
+        """
+        Writes settings to a temporary file and renames it over the config file, so a crash
+        mid-write never leaves a truncated config behind. Only fsyncs when durable is set.
+        """
+        data = json_dumps(settings, pretty=True)
+        tmp_path = self.config_file.with_suffix(self.config_file.suffix + '.tmp')
+        write_file_bytes(tmp_path, data, durable)
+        os.replace(tmp_path, self.config_file)
+        return data
 
     def get_setting(self, key: str, default=None):
-        return self._settings.get(key, default)
+        return self._ensure_parsed().get(key, default)
 
     def set_setting(self, key: str, value):
-        self._settings[key] = value
-        self._save_config(self._settings)
+        """Changes a setting in memory. The change is written to disk by flush() (at exit for shared configs)."""
+        self._ensure_parsed()[key] = value
+        self._refresh_cached_settings()
+        self._dirty = True
+
+    def update_settings(self, settings: dict):
+        """Applies several settings at once. The changes are written to disk by flush()."""
+        self._ensure_parsed().update(settings)
+        self._refresh_cached_settings()
+        self._dirty = True
+
+    def flush(self, durable: bool = False):
+        """
+        Writes the settings to disk if they changed since the last write.
+        Pass durable=True to also fsync the file before it replaces the old config.
+        """
+        if self._dirty:
+            self._save_config(self._settings, durable)
+            self._dirty = False
+
+    @contextmanager
+    def batch(self):
+        """Groups several set_setting calls into a single write on exit."""
+        try:
+            yield self
+        finally:
+            self.flush()
+
+    def difficulty_name(self, level: int) -> str:
+        """Returns the Beat Saber difficulty mapped to a numeric CH difficulty, or "" if it is unmapped."""
+        if not self._fully_parsed:
+            self._ensure_parsed()
+        if 0 <= level < len(self._difficulty_tuple):
+            return self._difficulty_tuple[level]
+        return ""
 
     @property
     def difficulty_mapping(self) -> dict:
-        return self._settings.get("difficulty_mapping", {})
+        if not self._fully_parsed:
+            self._ensure_parsed()
+        return self._difficulty_mapping
 
     @property
     def output_directory(self) -> Path:
-        return Path(self._settings.get("output_directory"))
+        if not self._fully_parsed:
+            self._ensure_parsed()
+        return self._output_directory
 
     @property
     def audio_target_format(self) -> str:
-        return self._settings.get("audio_target_format", "ogg")
+        if not self._fully_parsed:
+            self._ensure_parsed()
+        return self._audio_target_format
 
     @property
     def delete_temp_files(self) -> bool:
-        return self._settings.get("delete_temp_files", True)
\ No newline at end of file
+        if not self._fully_parsed:
+            self._ensure_parsed()
+        return self._delete_temp_files
+
+    @property
+    def temp_directory(self) -> Path | None:
+        """The configured extraction directory, or None to use the system temp directory."""
+        if not self._fully_parsed:
+            self._ensure_parsed()
+        return self._temp_directory
+
+    @property
+    def pretty_json(self) -> bool:
+        if not self._fully_parsed:
+            self._ensure_parsed()
+        return self._pretty_json
@@ -2,43 +2,48 @@
 
 from pathlib import Path
 import shutil
-from typing import Optional, Dict, Any, List
-import json
+from typing import Optional, Dict, Any, List, Tuple
+from bisect import bisect_right
+from operator import itemgetter
+import hashlib
 import math
 import os
-import mido
+import subprocess
+import threading
+import importlib.util
 import logging
 
-# pydub will be installed via requirements.txt
-# This import needs pydub to be available in the environment
-try:
-    from pydub import AudioSegment
-    from pydub.exceptions import CouldBeDangerous
-except ImportError:
-    print("Error: pydub not found. Please install it using 'pip install pydub'.")
-    print("Audio conversion features will be unavailable without pydub.")
-    AudioSegment = None
-    CouldBeDangerous = type('CouldBeDangerous', (Exception,), {}) # Dummy exception
+# pydub and mido are imported on first use (see _get_audiosegment/_get_midifile): both are slow
+# to import, and most conversions never need pydub, nor mido when the built-in MIDI reader succeeds.
+_audiosegment = None
+_midifile = None
 
-# mido will be installed via requirements.txt
+# soundfile (libsndfile) is optional; when present it handles WAV output without spawning ffmpeg
 try:
-    from mido import MidiFile, tempo2bpm, tick2second
-    from mido.midifiles.tracks import MidiTrack # For testing MIDI creation
+    import soundfile
 except ImportError:
-    print("Error: mido not found. Please install it using 'pip install mido'.")
-    print("MIDI parsing features will be unavailable without mido.")
-    MidiFile = None
-    tempo2bpm = None
-    tick2second = None
-    MidiTrack = None
+    soundfile = None
 
 
 from src.models import CloneHeroSongMetadata
 from src.config import AppConfig
+from src.utils import json_dumps, write_file_bytes
 
 # --- Constants ---
 BS_VERSION = "2.0.0"
 
+# Beat Saber difficulty names in rank order; _DIFF_RANK gives each one's _difficultyRank
+BS_DIFFICULTY_LEVELS = ("Easy", "Normal", "Hard", "Expert", "ExpertPlus")
+_DIFF_RANK = {name: rank for rank, name in enumerate(BS_DIFFICULTY_LEVELS)}
+
+# Written into each map folder after a successful conversion; holds the hash of the inputs
+# and settings it was made from on its first line, then the name of each file the conversion
+# wrote, so an unchanged song whose map is still complete can be skipped on the next run.
+CACHE_KEY_FILENAME = ".cache_key"
+
+# Source formats libsndfile can decode directly for the WAV fast path in convert_audio
+SOUNDFILE_INPUT_EXTENSIONS = frozenset({".wav", ".flac", ".ogg"})
+
 # Mapping from Clone Hero MIDI note numbers to Beat Saber "_lineIndex" and "_lineLayer"
 # Clone Hero typically uses MIDI notes 60-64 for standard 5-fret guitar:
 # Green = 60, Red = 61, Yellow = 62, Blue = 63, Orange = 64
@@ -75,43 +80,135 @@ CH_TO_BS_NOTE_MAP = {
     # Open Notes: Could map to bombs (_type: 3) or special blocks. For now, ignored if not in map.
     # Star Power: Could map to a specific lane or trigger an event for future lighting.
 }
+
+# CH_TO_BS_NOTE_MAP flattened into a table indexed by MIDI note number (always 0-127):
+# each entry is (_lineIndex, _lineLayer, _type_hint), or None for unmapped notes.
+NOTE_PLACEMENT_LUT = tuple(
+    (m["_lineIndex"], m["_lineLayer"], m["_type_hint"]) if (m := CH_TO_BS_NOTE_MAP.get(note)) else None
+    for note in range(128)
+)
 # --- End Constants ---
 
 
+def _get_audiosegment():
+    """Imports pydub's AudioSegment on first use. Returns None if pydub is not installed."""
+    global _audiosegment
+    if _audiosegment is None:
+        try:
+            from pydub import AudioSegment as _audiosegment
+        except ImportError:
+            logging.getLogger(__name__).error("Error: pydub not found. Please install it using 'pip install pydub'. "
+                                              "Audio conversion features will be unavailable without pydub.")
+    return _audiosegment
+
+def _get_midifile():
+    """Imports mido's MidiFile on first use. Returns None if mido is not installed."""
+    global _midifile
+    if _midifile is None:
+        try:
+            from mido import MidiFile as _midifile
+        except ImportError:
+            logging.getLogger(__name__).error("Error: mido not found. Please install it using 'pip install mido'. "
+                                              "MIDI parsing features will be unavailable without mido.")
+    return _midifile
+
+def _tempo_to_bpm(tempo: int) -> float:
+    """Converts a MIDI tempo (microseconds per beat) to BPM. Same result as mido.tempo2bpm for 4/4."""
+    return 60_000_000 / tempo
+
+def _fast_copy(src: Path, dst: Path):
+    """
+    Copies src to dst as cheaply as the platform allows: a hard link when both are on the same
+    filesystem, then an in-kernel os.copy_file_range (Linux; reflinks on copy-on-write filesystems),
+    and finally a regular shutil.copy. An existing dst is replaced.
+    """
+    try:
+        try:
+            os.link(src, dst)
+        except FileExistsError:
+            # Only drop the old file once a link can replace it; the copies below overwrite in place
+            dst.unlink()
+            os.link(src, dst)
+        return
+    except OSError:
+        pass # Different filesystem, or links not supported
+
+    if hasattr(os, "copy_file_range"):
+        try:
+            with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                remaining = os.fstat(fsrc.fileno()).st_size
+                while remaining > 0:
+                    copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+            if remaining == 0:
+                return
+        except OSError:
+            pass # e.g. not supported between these filesystems
+
+    shutil.copy(src, dst)
+
+def _read_vlq(data: bytes, pos: int) -> Tuple[int, int]:
+    """Reads a MIDI variable-length quantity starting at pos. Returns (value, position after it)."""
+    value = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value = (value << 7) | (byte & 0x7F)
+        if byte < 0x80:
+            return value, pos
+
+
 class Converter:
+    # Results of the environment checks, shared by all instances. See _ensure_env.
+    _env_checked = False
+    # One lock per map output folder (see _output_dir_lock), since two ZIPs of the same song share a folder
+    _output_dir_locks: Dict[str, threading.Lock] = {}
+    _output_dir_locks_guard = threading.Lock()
+    _ffmpeg_path: Optional[str] = None
+    _ffmpeg_available = False
+
     def __init__(self, config: AppConfig):
         self.config = config
-        self._check_ffmpeg()
-        self._check_mido()
+        self.ffmpeg_threads: Optional[int] = None # Passed to ffmpeg as -threads when set (the UI sets 1 when converting several songs at once)
         self.logger = logging.getLogger(__name__)
+        self._ensure_env()
 
-    def _check_ffmpeg(self):
-        """Checks if ffmpeg is available in the system's PATH."""
-        if AudioSegment is None:
-            self.logger.warning("WARNING: pydub is not installed. ffmpeg check skipped, audio conversion impossible.")
+    @classmethod
+    def _ensure_env(cls):
+        """Runs the ffmpeg and mido checks once per process, however many Converters are created."""
+        if cls._env_checked:
             return
-
-        if shutil.which("ffmpeg") is None:
-            self.logger.warning("WARNING: ffmpeg not found in PATH. Audio conversion will fail. "
+        cls._check_ffmpeg()
+        cls._check_mido()
+        cls._env_checked = True
+
+    @classmethod
+    def _check_ffmpeg(cls):
+        """Checks if ffmpeg is available in the system's PATH and remembers where it is."""
+        logger = logging.getLogger(__name__)
+        cls._ffmpeg_path = shutil.which("ffmpeg")
+        cls._ffmpeg_available = cls._ffmpeg_path is not None
+
+        if not cls._ffmpeg_available:
+            logger.warning("WARNING: ffmpeg not found in PATH. Audio conversion will fail. "
                   "Please install ffmpeg (e.g., via your OS package manager or from ffmpeg.org) "
                   "and ensure it's accessible from your system's PATH.")
         else:
-            self.logger.info("ffmpeg found in PATH. Audio conversion should proceed.")
+            logger.info("ffmpeg found in PATH. Audio conversion should proceed.")
 
-    def _check_mido(self):
+    @classmethod
+    def _check_mido(cls):
         """Checks if mido is available."""
-        if MidiFile is None:
-            self.logger.warning("WARNING: mido is not installed. MIDI parsing will fail.")
+        if importlib.util.find_spec("mido") is None:
+            logging.getLogger(__name__).warning("WARNING: mido is not installed. MIDI files the built-in reader can't handle will fail to parse.")
             
     def convert_audio(self, metadata: CloneHeroSongMetadata) -> Optional[Path]:
         """
         Converts the audio file specified in metadata to the target format (ogg or wav).
         Returns the path to the converted audio file, or None if conversion fails.
         """
-        if AudioSegment is None:
-            self.logger.error("Error: pydub is not installed. Cannot perform audio conversion.")
-            return None
-
         if not metadata.audio_path or not metadata.audio_path.exists():
             self.logger.error(f"Error: No audio file found for conversion or path is invalid for {metadata.name}.")
             return None
@@ -130,13 +227,30 @@ class Converter:
         if metadata.audio_path.suffix.lower() == f".{target_format}":
             self.logger.info(f"Audio is already in target format {target_format}. Copying directly.")
             try:
-                shutil.copy(metadata.audio_path, output_audio_path)
+                _fast_copy(metadata.audio_path, output_audio_path)
                 return output_audio_path
             except Exception as e:
                 self.logger.error(f"Error copying audio file: {e}")
                 return None
 
         self.logger.info(f"Converting audio from {metadata.audio_path.suffix} to .{target_format}...")
+        if (target_format == "wav" and soundfile is not None
+                and metadata.audio_path.suffix.lower() in SOUNDFILE_INPUT_EXTENSIONS):
+            converted_path = self._convert_audio_with_soundfile(metadata.audio_path, output_audio_path)
+            if converted_path:
+                return converted_path
+            # Otherwise fall through to ffmpeg/pydub (e.g. libsndfile built without Vorbis support)
+
+        if self._ffmpeg_available:
+            return self._convert_audio_with_ffmpeg(metadata.audio_path, output_audio_path, target_format)
+
+        # Fallback: pydub (e.g. when it has been pointed at an ffmpeg binary outside PATH).
+        # Checked only here, so copies and the soundfile path above work without ffmpeg or pydub.
+        AudioSegment = _get_audiosegment()
+        if AudioSegment is None:
+            self.logger.error("Error: Neither ffmpeg nor pydub is available. Cannot perform audio conversion.")
+            return None
+        from pydub.exceptions import CouldntDecodeError
         try:
             audio = AudioSegment.from_file(metadata.audio_path)
             if target_format == "ogg":
@@ -145,89 +259,137 @@ class Converter:
                 audio.export(output_audio_path, format=target_format)
             self.logger.info(f"Audio converted and saved to {output_audio_path}")
             return output_audio_path
-        except CouldBeDangerous as e:
-            self.logger.warning(f"Warning: pydub issued a 'CouldBeDangerous' warning. "
+        except CouldntDecodeError as e:
+            self.logger.warning(f"Warning: pydub could not decode the audio. "
                   f"This might indicate an issue with audio file or ffmpeg: {e}")
             return None
         except Exception as e:
             self.logger.error(f"Error converting audio file {metadata.audio_path}: {e}")
             return None
 
+    def _convert_audio_with_soundfile(self, source_path: Path, output_audio_path: Path) -> Optional[Path]:
+        """
+        Decodes source_path with libsndfile and writes it as 16-bit PCM WAV, block by block.
+        Returns None if libsndfile can't handle the file so the caller can fall back to ffmpeg.
+        """
+        try:
+            with soundfile.SoundFile(str(source_path)) as source, \
+                    soundfile.SoundFile(str(output_audio_path), 'w', samplerate=source.samplerate,
+                                        channels=source.channels, format='WAV', subtype='PCM_16') as target:
+                for block in source.blocks(blocksize=65536, dtype='int16'):
+                    target.write(block)
+        except Exception as e:
+            self.logger.warning(f"Warning: soundfile could not convert {source_path}, falling back to ffmpeg: {e}")
+            return None
+
+        self.logger.info(f"Audio converted and saved to {output_audio_path}")
+        return output_audio_path
+
+    def _convert_audio_with_ffmpeg(self, source_path: Path, output_audio_path: Path, target_format: str) -> Optional[Path]:
+        """
+        Transcodes source_path by running ffmpeg directly, which streams the audio instead of
+        decoding it all into memory first like pydub does. Only the first audio stream is kept.
+        """
+        if target_format == "ogg":
+            codec_args = ["-c:a", "libvorbis", "-b:a", "192k"]
+        else: # wav
+            codec_args = ["-c:a", "pcm_s16le"]
+
+        if self.ffmpeg_threads:
+            codec_args += ["-threads", str(self.ffmpeg_threads)]
+
+        command = [self._ffmpeg_path, "-y", "-hide_banner", "-i", str(source_path),
+                   "-map", "0:a:0", "-vn", *codec_args, str(output_audio_path)]
+        try:
+            result = subprocess.run(command, check=True, capture_output=True, encoding="utf-8", errors="replace")
+        except subprocess.CalledProcessError as e:
+            self.logger.error(f"Error converting audio file {source_path}: ffmpeg exited with code {e.returncode}: {e.stderr.strip()}")
+            return None
+        except OSError as e:
+            self.logger.error(f"Error running ffmpeg for {source_path}: {e}")
+            return None
+
+        self.logger.debug(f"ffmpeg output for {source_path}:\n{result.stderr}")
+        self.logger.info(f"Audio converted and saved to {output_audio_path}")
+        return output_audio_path
+
     def _get_tempo_map(self, mid_file) -> List[tuple]:
         """
-        Generates a tempo map from a MIDI file.
-        Returns a list of tuples: (absolute_tick, tempo_in_microseconds_per_beat, bpm_at_this_tick).
+        Generates a tempo map from a mido MidiFile.
+        Returns a list of tuples: (absolute_tick, tempo_in_microseconds_per_beat).
         """
-        tempo_map = []
-        current_tempo = 500000  # Default to 120 BPM (500,000 microseconds per beat)
-        current_tick = 0
-        
-        # Add initial tempo (even if it's default) at tick 0
-        tempo_map.append((0, current_tempo, tempo2bpm(current_tempo)))
-
-        # Iterate through all tracks to find tempo changes. Tempo events are global.
-        # We need to accumulate time globally for tempo changes.
-        all_tempo_events = []
-        for track in mid_file.tracks:
-            abs_track_tick = 0
-            for msg in track:
-                abs_track_tick += msg.time
-                if msg.type == 'set_tempo':
-                    all_tempo_events.append((abs_track_tick, msg.tempo))
-        
-        # Sort all tempo events by their absolute tick time
-        all_tempo_events.sort(key=lambda x: x[0])
+        # Tempo events are global and conventionally all live in the first track. Only when
+        # that track has none are the other tracks scanned too.
+        all_tempo_events = self._get_track_tempo_events(mid_file.tracks[0]) if mid_file.tracks else []
+        if not all_tempo_events:
+            for track in mid_file.tracks[1:]:
+                all_tempo_events += self._get_track_tempo_events(track)
+
+        return self._build_tempo_map(all_tempo_events)
+
+    def _get_track_tempo_events(self, track) -> List[tuple]:
+        """Returns (absolute_tick, tempo) for every set_tempo in a mido track."""
+        tempo_events = []
+        abs_track_tick = 0
+        for msg in track:
+            abs_track_tick += msg.time
+            # set_tempo is a meta message, so channel messages (the bulk of a track) are skipped cheaply
+            if msg.is_meta and msg.type == 'set_tempo':
+                tempo_events.append((abs_track_tick, msg.tempo))
+        return tempo_events
+
+    def _build_tempo_map(self, all_tempo_events: List[tuple]) -> List[tuple]:
+        """
+        Builds a tempo map from (absolute_tick, tempo_in_microseconds_per_beat) events.
+        Returns a list of tuples: (absolute_tick, tempo_in_microseconds_per_beat), starting at tick 0
+        and keeping only actual tempo changes. Of several events at the same tick, the last one wins.
+        """
+        all_tempo_events.sort(key=itemgetter(0))
 
-        for event_tick, event_tempo in all_tempo_events:
-            if not tempo_map or tempo_map[-1][1] != event_tempo or event_tick == 0:
-                # Add if tempo actually changed or if it's the very first explicit tempo change
-                tempo_map.append((event_tick, event_tempo, tempo2bpm(event_tempo)))
-        
-        # Ensure tempo_map starts with tick 0 and is sorted
-        tempo_map_final = [t for t in tempo_map if t[0] == 0] + [t for t in tempo_map if t[0] > 0]
-        # Remove duplicates based on tick if any
-        seen_ticks = set()
-        unique_tempo_map = []
-        for item in tempo_map_final:
-            if item[0] not in seen_ticks:
-                unique_tempo_map.append(item)
-                seen_ticks.add(item[0])
-            elif item[0] == 0 and unique_tempo_map[0][1] != item[1]: # Special case for tick 0 if tempo is immediately changed
-                unique_tempo_map[0] = item # Overwrite initial default if an actual tempo is at tick 0
-        
-        return sorted(unique_tempo_map, key=lambda x: x[0])
+        # Default to 120 BPM (500,000 microseconds per beat) until the first explicit tempo
+        tempo_map = [(0, 500000)]
+        for event in all_tempo_events:
+            if event[0] == tempo_map[-1][0]:
+                tempo_map[-1] = event
+            elif event[1] != tempo_map[-1][1]:
+                tempo_map.append(event)
 
+        return tempo_map
 
-    def _ticks_to_seconds(self, tick: int, tempo_map: List[tuple], ticks_per_beat: int) -> float:
+    def _build_tempo_lookup(self, tempo_map: List[tuple], ticks_per_beat: int) -> Tuple[List[int], List[float], List[float]]:
         """
-        Converts a MIDI tick to an absolute time in seconds, accounting for tempo changes.
-        Tempo map: [(absolute_tick, tempo_in_microseconds_per_beat, bpm_at_that_tick)]
+        Precomputes the tempo segments of a tempo map for _ticks_to_seconds.
+        Returns three parallel lists: each segment's start tick, the absolute time in seconds
+        at that tick, and the segment's length of a beat in seconds.
         """
+        segment_ticks = []
+        segment_seconds = []
+        segment_seconds_per_beat = []
+
         current_seconds = 0.0
         last_tick_in_map = 0
-        
-        # Find the starting tempo for calculations.
         # Tempo map is guaranteed to have at least one entry at tick 0.
-        last_tempo_us_per_beat = tempo_map[0][1] 
-
-        # Iterate through the tempo map to find the relevant tempo segment
-        for map_tick_boundary, tempo_us_per_beat, _ in tempo_map:
-            if tick < map_tick_boundary:
-                # The target tick is within the current segment (from last_tick_in_map to map_tick_boundary)
-                ticks_in_segment = tick - last_tick_in_map
-                current_seconds += (ticks_in_segment / ticks_per_beat) * (last_tempo_us_per_beat / 1_000_000.0)
-                return current_seconds
-            else:
-                # Add the full duration of this tempo segment
-                ticks_in_segment = map_tick_boundary - last_tick_in_map
-                current_seconds += (ticks_in_segment / ticks_per_beat) * (last_tempo_us_per_beat / 1_000_000.0)
-                last_tick_in_map = map_tick_boundary
-                last_tempo_us_per_beat = tempo_us_per_beat
-        
-        # If the tick is beyond all explicit tempo changes (i.e., in the last segment defined)
-        ticks_in_segment = tick - last_tick_in_map
-        current_seconds += (ticks_in_segment / ticks_per_beat) * (last_tempo_us_per_beat / 1_000_000.0)
-        return current_seconds
+        last_seconds_per_beat = tempo_map[0][1] / 1_000_000.0
+        for map_tick_boundary, tempo_us_per_beat in tempo_map:
+            # Add the full duration of the previous tempo segment
+            current_seconds += ((map_tick_boundary - last_tick_in_map) / ticks_per_beat) * last_seconds_per_beat
+            last_tick_in_map = map_tick_boundary
+            last_seconds_per_beat = tempo_us_per_beat / 1_000_000.0
+
+            segment_ticks.append(map_tick_boundary)
+            segment_seconds.append(current_seconds)
+            segment_seconds_per_beat.append(last_seconds_per_beat)
+
+        return segment_ticks, segment_seconds, segment_seconds_per_beat
+
+    def _ticks_to_seconds(self, tick: int, tempo_lookup: Tuple[List[int], List[float], List[float]], ticks_per_beat: int) -> float:
+        """
+        Converts a MIDI tick to an absolute time in seconds, accounting for tempo changes.
+        tempo_lookup comes from _build_tempo_lookup; the segment containing tick is found by binary search.
+        """
+        segment_ticks, segment_seconds, segment_seconds_per_beat = tempo_lookup
+        i = bisect_right(segment_ticks, tick) - 1
+        return segment_seconds[i] + ((tick - segment_ticks[i]) / ticks_per_beat) * segment_seconds_per_beat[i]
 
     def _get_dominant_bpm(self, tempo_map: List[tuple]) -> float:
         """
@@ -237,80 +399,146 @@ class Converter:
         if not tempo_map:
             return 120.0 # Default if no tempo map
         
-        return tempo_map[0][2]
+        return _tempo_to_bpm(tempo_map[0][1])
 
 
-    def _parse_midi_notes(self, midi_path: Path, tempo_map: List[tuple], ticks_per_beat: int, dominant_bpm: float) -> List[Dict[str, Any]]:
+    def _parse_midi_notes(self, mid_file, tempo_map: List[tuple], dominant_bpm: float) -> List[tuple]:
         """
-        Parses MIDI notes from the given path, converting them to raw Beat Saber compatible notes.
-        Returns a flat list of ALL detected and mapped Beat Saber note objects (before color/cut direction).
-        Each note includes '_type_hint' from CH_TO_BS_NOTE_MAP for saber assignment.
+        Parses MIDI notes from an already loaded mido MidiFile, converting them to raw Beat Saber compatible notes.
+        Returns a flat list of ALL detected and mapped notes (before color/cut direction), sorted by time.
+        Each note is a tuple (time_in_beats, midi_note, line_index, line_layer, type_hint), where
+        type_hint comes from CH_TO_BS_NOTE_MAP for saber assignment.
         """
-        if MidiFile is None:
-            self.logger.error("Error: mido is not installed. Cannot parse MIDI.")
-            return []
-
-        if not midi_path.exists():
-            self.logger.error(f"Error: MIDI file not found at {midi_path}")
-            return []
-
-        try:
-            mid = MidiFile(midi_path)
-        except Exception as e:
-            self.logger.error(f"Error reading MIDI file {midi_path}: {e}")
-            return []
-        
-        all_raw_bs_notes = [] # List of Beat Saber note objects
-        
-        for i, track in enumerate(mid.tracks):
+        note_events = [] # (absolute_tick, midi_note) of every mapped note_on, track by track
+        for i, track in enumerate(mid_file.tracks):
             self.logger.info(f"Processing MIDI track: {track.name or f'Track {i}'}")
             absolute_tick_time_track = 0 
             for msg in track:
                 absolute_tick_time_track += msg.time 
                 
-                if msg.type == 'note_on' and msg.velocity > 0:
-                    mapping = CH_TO_BS_NOTE_MAP.get(msg.note)
-                    if mapping:
-                        # Convert absolute ticks to seconds, then to beats relative to dominant BPM
-                        time_in_seconds = self._ticks_to_seconds(absolute_tick_time_track, tempo_map, ticks_per_beat)
-                        _time_beats = time_in_seconds * (dominant_bpm / 60.0)
-                        
-                        all_raw_bs_notes.append({
-                            "_time_raw_beats": _time_beats, # Store raw beat time
-                            "_midi_note": msg.note, # Keep original midi note for potential future use
-                            "_lineIndex": mapping["_lineIndex"],
-                            "_lineLayer": mapping["_lineLayer"],
-                            "_type_hint": mapping["_type_hint"], # Store saber type hint
-                        })
-        
-        # Sort notes by raw beat time
-        all_raw_bs_notes.sort(key=lambda x: x["_time_raw_beats"])
-        
+                if msg.type == 'note_on' and msg.velocity > 0 and NOTE_PLACEMENT_LUT[msg.note] is not None:
+                    note_events.append((absolute_tick_time_track, msg.note))
+
+        return self._raw_notes_from_events(note_events, tempo_map, mid_file.ticks_per_beat, dominant_bpm)
+
+    def _raw_notes_from_events(self, note_events: List[tuple], tempo_map: List[tuple], ticks_per_beat: int, dominant_bpm: float) -> List[tuple]:
+        """
+        Turns (absolute_tick, midi_note) events into the raw note tuples described in _parse_midi_notes.
+        """
+        all_raw_bs_notes = [] # List of raw note tuples, see _parse_midi_notes
+        tempo_lookup = self._build_tempo_lookup(tempo_map, ticks_per_beat)
+        beats_per_second = dominant_bpm / 60.0
+
+        for absolute_tick, midi_note in note_events:
+            placement = NOTE_PLACEMENT_LUT[midi_note]
+            if placement is not None:
+                # Convert absolute ticks to seconds, then to beats relative to dominant BPM
+                time_in_seconds = self._ticks_to_seconds(absolute_tick, tempo_lookup, ticks_per_beat)
+                # Original midi note is kept for potential future use
+                all_raw_bs_notes.append((time_in_seconds * beats_per_second, midi_note, *placement))
+
+        # Sort notes by raw beat time (stable, so simultaneous notes keep track order)
+        all_raw_bs_notes.sort(key=itemgetter(0))
+
         return all_raw_bs_notes
 
-    def _map_notes_to_beatsaber_format(self, raw_bs_notes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def _fast_scan_midi(self, midi_path: Path) -> Optional[Tuple[int, List[tuple], List[tuple]]]:
+        """
+        Reads a Standard MIDI File directly from its bytes, keeping only what the conversion uses.
+        Returns (ticks_per_beat, tempo_events, note_events), where tempo_events holds
+        (absolute_tick, tempo) for every set_tempo and note_events holds (absolute_tick, midi_note)
+        for every mapped note_on with non-zero velocity, track by track.
+        Returns None if the file uses features this reader doesn't handle (e.g. SMPTE timing)
+        or is malformed, so the caller can fall back to mido.
+        """
+        data = midi_path.read_bytes()
+        if data[:4] != b"MThd":
+            return None
+        header_length = int.from_bytes(data[4:8], "big")
+        division = int.from_bytes(data[12:14], "big")
+        if division & 0x8000 or division == 0:
+            return None # SMPTE time division, leave it to mido
+
+        tempo_events = [] # From the first track
+        other_tempo_events = [] # From the other tracks, only used if the first track has none
+        note_events = []
+        pos = 8 + header_length
+        track_index = -1
+        try:
+            while pos + 8 <= len(data):
+                chunk_type = data[pos:pos + 4]
+                track_end = pos + 8 + int.from_bytes(data[pos + 4:pos + 8], "big")
+                pos += 8
+                if chunk_type != b"MTrk":
+                    pos = track_end # Unknown chunk types must be skipped
+                    continue
+                track_index += 1
+                track_tempo_events = tempo_events if track_index == 0 else other_tempo_events
+
+                absolute_tick = 0
+                status = 0
+                while pos < track_end:
+                    delta, pos = _read_vlq(data, pos)
+                    absolute_tick += delta
+                    byte = data[pos]
+
+                    if byte == 0xFF: # Meta event
+                        meta_type = data[pos + 1]
+                        length, pos = _read_vlq(data, pos + 2)
+                        if meta_type == 0x51 and length == 3: # set_tempo
+                            track_tempo_events.append((absolute_tick, int.from_bytes(data[pos:pos + 3], "big")))
+                        pos += length
+                    elif byte == 0xF0 or byte == 0xF7: # SysEx
+                        length, pos = _read_vlq(data, pos + 1)
+                        pos += length
+                    else: # Channel message, possibly using running status
+                        if byte & 0x80:
+                            status = byte
+                            pos += 1
+                        elif not status:
+                            return None
+                        kind = status & 0xF0
+                        if kind == 0x90:
+                            note, velocity = data[pos], data[pos + 1]
+                            if velocity and NOTE_PLACEMENT_LUT[note] is not None:
+                                note_events.append((absolute_tick, note))
+                            pos += 2
+                        elif kind == 0xC0 or kind == 0xD0: # Program change / channel pressure
+                            pos += 1
+                        else:
+                            pos += 2
+                pos = track_end
+        except IndexError:
+            self.logger.debug(f"MIDI file {midi_path} is truncated or malformed, falling back to mido.")
+            return None
+
+        # Same rule as _get_tempo_map: prefer the first track's tempo events
+        return division, tempo_events or other_tempo_events, note_events
+
+    def _map_notes_to_beatsaber_format(self, raw_bs_notes: List[tuple]) -> List[Dict[str, Any]]:
         """
-        Takes raw Beat Saber notes and applies _type (color) and _cutDirection based on CH_TO_BS_NOTE_MAP's type hint.
+        Takes raw note tuples from _parse_midi_notes and applies _type (color) and _cutDirection
+        based on CH_TO_BS_NOTE_MAP's type hint.
         """
         final_notes = []
         
         # Keep track of notes already placed at a specific beat time and position
-        placed_notes_at_beat_pos = set() # Stores (beat_time_rounded, lineIndex, lineLayer)
+        # Each position is packed into one int: milliBeats << 4 | lineIndex << 2 | lineLayer
+        # (lineIndex is 0-3 and lineLayer is 0-2, so both fit in 2 bits).
+        placed_notes_at_beat_pos = set()
 
-        for raw_note in raw_bs_notes:
-            _time = round(raw_note["_time_raw_beats"], 3) # Round beat time for clean JSON
-            _lineIndex = raw_note["_lineIndex"]
-            _lineLayer = raw_note["_lineLayer"]
-            _type = raw_note["_type_hint"] # Use the type hint from the map
+        for time_raw_beats, _, _lineIndex, _lineLayer, _type in raw_bs_notes: # _type is the type hint from the map
+            # Quantize beat time to whole milliBeats with integer arithmetic (times are never negative)
+            time_milli_beats = int(time_raw_beats * 1000 + 0.5)
             _cutDirection = 0 # Default to Up cut for now. (Future: vary based on velocity/context)
 
-            note_position_key = (_time, _lineIndex, _lineLayer)
+            note_position_key = (time_milli_beats << 4) | (_lineIndex << 2) | _lineLayer
             if note_position_key in placed_notes_at_beat_pos:
                 # If a note already exists at this exact beat time and position, skip it.
                 continue 
             
             final_notes.append({
-                "_time": _time,
+                "_time": time_milli_beats / 1000, # 3 decimals for clean JSON
                 "_lineIndex": _lineIndex,
                 "_lineLayer": _lineLayer,
                 "_type": _type,
@@ -320,8 +548,9 @@ class Converter:
             
         return final_notes
 
-    def _generate_info_dat(self, metadata: CloneHeroSongMetadata, audio_filename: str, cover_filename: str, bpm: float) -> Dict[str, Any]:
-        """Generates the content for info.dat."""
+    def _generate_info_dat(self, metadata: CloneHeroSongMetadata, audio_filename: str, cover_filename: str, bpm: float,
+                           difficulty_beatmaps: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Generates the content for info.dat. An empty difficulty_beatmaps list yields a map with no difficulties."""
         return {
             "_version": BS_VERSION,
             "_songName": metadata.name,
@@ -340,7 +569,10 @@ class Converter:
             "_allDirectionsEnvironmentName": "DefaultEnvironment", # Only for version > 3.0.0
             "_songPreviewAudioClipPath": audio_filename, # Alias for _songFilename in newer versions
             "_customData": {},
-            "_difficultyBeatmapSets": [] # This will be populated later
+            "_difficultyBeatmapSets": [{
+                "_beatmapCharacteristicName": "Standard", # Most common characteristic
+                "_difficultyBeatmaps": difficulty_beatmaps
+            }] if difficulty_beatmaps else []
         }
 
     def _generate_difficulty_dat(self, notes: List[Dict[str, Any]]) -> Dict[str, Any]:
@@ -357,21 +589,99 @@ class Converter:
             "_customData": {}
         }
 
+    def _conversion_cache_key(self, metadata: CloneHeroSongMetadata) -> str:
+        """
+        Hashes everything a conversion's output depends on: the MIDI, audio and cover contents,
+        the song metadata, the relevant settings and the note mapping.
+        File contents are hashed rather than mtimes because every extraction rewrites the files.
+        """
+        hasher = hashlib.blake2b(digest_size=16)
+        for path in (metadata.midi_path, metadata.audio_path, metadata.cover_path):
+            if path and path.exists():
+                with open(path, 'rb') as f:
+                    while chunk := f.read(1 << 20):
+                        hasher.update(chunk)
+            hasher.update(b"\0")
+        hasher.update(repr((
+            BS_VERSION, CH_TO_BS_NOTE_MAP,
+            self.config.audio_target_format, self.config.difficulty_mapping, self.config.pretty_json,
+            metadata.name, metadata.artist, metadata.album, metadata.charter,
+            metadata.preview_start_time, sorted(metadata.difficulties.items()),
+        )).encode('utf-8'))
+        return hasher.hexdigest()
+
+    def _is_conversion_cached(self, bs_map_output_dir: Path, cache_key: str) -> bool:
+        """
+        Checks whether bs_map_output_dir holds a complete map made from inputs matching cache_key,
+        i.e. the stored key matches and every file recorded with it still exists.
+        """
+        try:
+            stored_key, *output_files = (bs_map_output_dir / CACHE_KEY_FILENAME).read_text(encoding='utf-8').split("\n")
+        except OSError:
+            return False
+        return (stored_key == cache_key and bool(output_files)
+                and all((bs_map_output_dir / name).exists() for name in output_files))
+
+    def _write_cache_key(self, bs_map_output_dir: Path, cache_key: Optional[str], output_files: List[str] = ()):
+        """
+        Records the cache key of a successful conversion along with the names of the files it wrote,
+        or removes the stored key when cache_key is None.
+        Failures are only logged; at worst the song gets converted again next time.
+        """
+        cache_key_path = bs_map_output_dir / CACHE_KEY_FILENAME
+        try:
+            if cache_key:
+                write_file_bytes(cache_key_path, "\n".join([cache_key, *output_files]).encode('utf-8'))
+            else:
+                cache_key_path.unlink(missing_ok=True)
+        except OSError as e:
+            self.logger.warning(f"Warning: Could not write conversion cache key to {bs_map_output_dir}: {e}")
+
+    def _write_json(self, path: Path, content: Dict[str, Any]):
+        """Writes content as JSON, compact unless the pretty_json setting is enabled."""
+        write_file_bytes(path, json_dumps(content, pretty=self.config.pretty_json))
+
+    @classmethod
+    def _output_dir_lock(cls, bs_map_output_dir: Path) -> threading.Lock:
+        """Returns the lock serializing conversions into bs_map_output_dir within this process."""
+        key = os.path.abspath(bs_map_output_dir)
+        with cls._output_dir_locks_guard:
+            lock = cls._output_dir_locks.get(key)
+            if lock is None:
+                lock = cls._output_dir_locks[key] = threading.Lock()
+            return lock
+
     def convert_to_beatsaber(self, metadata: CloneHeroSongMetadata) -> bool:
         """
         Orchestrates the conversion of a Clone Hero song (metadata, midi, audio, cover)
         into Beat Saber map format, including multiple difficulties.
+        Safe to call from several threads: songs sharing an output folder are converted one at a time.
         """
+        bs_map_output_dir = self.config.output_directory / f"{metadata.artist} - {metadata.name}"
+        with self._output_dir_lock(bs_map_output_dir):
+            return self._convert_to_beatsaber(metadata, bs_map_output_dir)
+
+    def _convert_to_beatsaber(self, metadata: CloneHeroSongMetadata, bs_map_output_dir: Path) -> bool:
+        """convert_to_beatsaber, run while holding the lock for bs_map_output_dir."""
         self.logger.info(f"\n--- Starting Beat Saber Conversion for: {metadata.name} ---")
 
         # 1. Ensure MIDI file exists
-        if MidiFile is None:
-            self.logger.error(f"Error: mido is not installed. Cannot convert MIDI for {metadata.name}.")
-            return False
         if not metadata.midi_path or not metadata.midi_path.exists():
             self.logger.error(f"Error: MIDI file (notes.mid) not found for {metadata.name}. Cannot convert to Beat Saber.")
             return False
 
+        # Skip the song if the map folder was already generated from identical inputs and settings
+        try:
+            cache_key = self._conversion_cache_key(metadata)
+        except OSError as e:
+            self.logger.warning(f"Warning: Could not compute conversion cache key for {metadata.name}: {e}")
+            cache_key = None
+        if cache_key and self._is_conversion_cached(bs_map_output_dir, cache_key):
+            self.logger.info(f"{metadata.name} is unchanged since its last conversion. Skipping.")
+            return True
+        # Invalidate any previous key first, so a conversion that fails halfway is never treated as cached
+        self._write_cache_key(bs_map_output_dir, None)
+
         # 2. Convert audio
         converted_audio_path = self.convert_audio(metadata)
         if not converted_audio_path:
@@ -379,13 +689,12 @@ class Converter:
             return False
         
         # 3. Copy cover image
-        bs_map_output_dir = self.config.output_directory / f"{metadata.artist} - {metadata.name}"
         bs_map_output_dir.mkdir(parents=True, exist_ok=True) 
         
         cover_filename = "cover.jpg" # Standard Beat Saber cover image filename
         if metadata.cover_path and metadata.cover_path.exists():
             try:
-                shutil.copy(metadata.cover_path, bs_map_output_dir / cover_filename)
+                _fast_copy(metadata.cover_path, bs_map_output_dir / cover_filename)
                 self.logger.info(f"Cover image copied to {bs_map_output_dir / cover_filename}")
             except Exception as e:
                 self.logger.warning(f"Warning: Could not copy cover image {metadata.cover_path}: {e}")
@@ -395,123 +704,118 @@ class Converter:
             cover_filename = ""
 
         # 4. Parse MIDI for tempo map, dominant BPM, and all raw notes
+        # Get all mappable notes from MIDI, regardless of declared difficulty
         try:
-            midi_file_obj = MidiFile(metadata.midi_path)
-            tempo_map = self._get_tempo_map(midi_file_obj)
-            dominant_bpm = self._get_dominant_bpm(tempo_map)
-            
-            # Get all mappable notes from MIDI, regardless of declared difficulty
-            all_raw_bs_notes = self._parse_midi_notes(metadata.midi_path, tempo_map, midi_file_obj.ticks_per_beat, dominant_bpm)
+            midi_scan = self._fast_scan_midi(metadata.midi_path)
+            if midi_scan is not None:
+                ticks_per_beat, tempo_events, note_events = midi_scan
+                tempo_map = self._build_tempo_map(tempo_events)
+                dominant_bpm = self._get_dominant_bpm(tempo_map)
+                all_raw_bs_notes = self._raw_notes_from_events(note_events, tempo_map, ticks_per_beat, dominant_bpm)
+            else:
+                # Fall back to mido for files the built-in reader doesn't handle
+                MidiFile = _get_midifile()
+                if MidiFile is None:
+                    self.logger.error(f"Error: mido is not installed. Cannot convert MIDI for {metadata.name}.")
+                    return False
+                midi_file_obj = MidiFile(metadata.midi_path)
+                tempo_map = self._get_tempo_map(midi_file_obj)
+                dominant_bpm = self._get_dominant_bpm(tempo_map)
+                all_raw_bs_notes = self._parse_midi_notes(midi_file_obj, tempo_map, dominant_bpm)
 
         except Exception as e:
             self.logger.error(f"Error during MIDI parsing: {e}")
             return False
 
         # If no notes were parsed, we can't create any difficulty maps.
+        difficulty_beatmaps = [] # _difficultyBeatmaps entries for info.dat, one per written difficulty
         if not all_raw_bs_notes:
             self.logger.warning(f"Warning: No mappable notes found in MIDI file for {metadata.name}. "
                   "Generating info.dat with no difficulty maps.")
-            # Generate info.dat anyway as a base
-            info_dat_content = self._generate_info_dat(metadata, converted_audio_path.name, cover_filename, dominant_bpm)
-            info_dat_path = bs_map_output_dir / "info.dat"
-            try:
-                with open(info_dat_path, 'w', encoding='utf-8') as f:
-                    json.dump(info_dat_content, f, indent=4)
-                self.logger.info(f"Generated Beat Saber info.dat (no difficulties): {info_dat_path}")
-                return True
-            except Exception as e:
-                self.logger.error(f"Error writing info.dat file {info_dat_path}: {e}")
-                return False
-
-        # 5. Determine which Beat Saber difficulties to generate
-        difficulties_to_generate = set() # Use a set to avoid duplicate BS difficulty outputs
-        
-        ch_to_bs_difficulty_map = self.config.difficulty_mapping
-
-        if metadata.difficulties:
-            for ch_instrument_diff_key, ch_numeric_diff_val in metadata.difficulties.items():
-                # ch_numeric_diff_val is typically 0-6 in CH. Config maps these to BS strings.
-                mapped_bs_difficulty = ch_to_bs_difficulty_map.get(str(ch_numeric_diff_val), None)
-                if mapped_bs_difficulty:
-                    difficulties_to_generate.add(mapped_bs_difficulty)
-                else:
-                    self.logger.warning(f"Warning: No Beat Saber difficulty mapping found for Clone Hero numeric difficulty '{ch_numeric_diff_val}' "
-                          f"from '{ch_instrument_diff_key}'. Skipping this difficulty.")
-        
-        # Rule: If no difficulties are found in song.ini or couldn't be mapped, default to Expert
-        if not difficulties_to_generate:
-            self.logger.info("No mappable Clone Hero difficulties found in song.ini. Defaulting to 'Expert' Beat Saber map.")
-            difficulties_to_generate.add("Expert")
-
-        # 6. Generate Info.dat base structure
-        info_dat_content = self._generate_info_dat(metadata, converted_audio_path.name, cover_filename, dominant_bpm)
-        
-        # Prepare the _difficultyBeatmapSets structure
-        info_dat_content["_difficultyBeatmapSets"] = [{
-            "_beatmapCharacteristicName": "Standard", # Most common characteristic
-            "_difficultyBeatmaps": [] # Actual difficulties will be added here
-        }]
-
-        # 7. Generate difficulty .dat files for each determined Beat Saber difficulty
-        bs_difficulty_levels = ["Easy", "Normal", "Hard", "Expert", "ExpertPlus"] # Order for _difficultyRank
-
-        for bs_difficulty_name in sorted(list(difficulties_to_generate), key=lambda x: bs_difficulty_levels.index(x)):
-            self.logger.info(f"Generating Beat Saber map for difficulty: {bs_difficulty_name}")
-            
-            # Apply color/cut direction mapping. (Future: filter/simplify notes per difficulty here)
+        else:
+            # 5. Determine which Beat Saber difficulties to generate
+            difficulties_to_generate = set() # Use a set to avoid duplicate BS difficulty outputs
+
+            if metadata.difficulties:
+                for ch_instrument_diff_key, ch_numeric_diff_val in metadata.difficulties.items():
+                    # ch_numeric_diff_val is typically 0-6 in CH. Config maps these to BS strings.
+                    mapped_bs_difficulty = self.config.difficulty_name(ch_numeric_diff_val)
+                    if mapped_bs_difficulty in _DIFF_RANK:
+                        difficulties_to_generate.add(mapped_bs_difficulty)
+                    elif mapped_bs_difficulty:
+                        self.logger.warning(f"Warning: '{mapped_bs_difficulty}' (mapped from Clone Hero difficulty '{ch_numeric_diff_val}') "
+                              f"is not a Beat Saber difficulty. Expected one of: {', '.join(BS_DIFFICULTY_LEVELS)}. Skipping this difficulty.")
+                    else:
+                        self.logger.warning(f"Warning: No Beat Saber difficulty mapping found for Clone Hero numeric difficulty '{ch_numeric_diff_val}' "
+                              f"from '{ch_instrument_diff_key}'. Skipping this difficulty.")
+
+            # Rule: If no difficulties are found in song.ini or couldn't be mapped, default to Expert
+            if not difficulties_to_generate:
+                self.logger.info("No mappable Clone Hero difficulties found in song.ini. Defaulting to 'Expert' Beat Saber map.")
+                difficulties_to_generate.add("Expert")
+
+            # 6. Generate difficulty .dat files for each determined Beat Saber difficulty
+
+            # Every difficulty currently gets the same notes, so map and serialize them only once.
+            # (Future: filter/simplify notes per difficulty, which would move this back into the loop)
             final_bs_notes = self._map_notes_to_beatsaber_format(all_raw_bs_notes)
-            
-            difficulty_dat_content = self._generate_difficulty_dat(final_bs_notes)
-            
-            difficulty_filename = f"Standard{bs_difficulty_name}.dat"
-            difficulty_path = bs_map_output_dir / difficulty_filename
-
-            try:
-                with open(difficulty_path, 'w', encoding='utf-8') as f:
-                    json.dump(difficulty_dat_content, f, indent=4)
-                self.logger.info(f"Generated Beat Saber difficulty map: {difficulty_path}")
-                
-                # Add this difficulty to the info.dat structure
-                info_dat_entry = {
-                    "_difficulty": bs_difficulty_name,
-                    "_difficultyRank": bs_difficulty_levels.index(bs_difficulty_name),
-                    "_beatmapFilename": difficulty_filename,
-                    "_noteJumpMovementSpeed": 10, # Configurable later (often based on BPM/difficulty)
-                    "_noteJumpStartBeatOffset": 0,
-                    "_customData": {}
-                }
-                info_dat_content["_difficultyBeatmapSets"][0]["_difficultyBeatmaps"].append(info_dat_entry)
-
-            except Exception as e:
-                self.logger.error(f"Error writing difficulty .dat file {difficulty_path}: {e}")
-                return False # Critical failure for this difficulty, stop conversion
-
-        # 8. Write final info.dat
+            difficulty_dat_payload = json_dumps(self._generate_difficulty_dat(final_bs_notes), pretty=self.config.pretty_json)
+
+            for bs_difficulty_name in sorted(difficulties_to_generate, key=_DIFF_RANK.__getitem__):
+                self.logger.info(f"Generating Beat Saber map for difficulty: {bs_difficulty_name}")
+
+                difficulty_filename = f"Standard{bs_difficulty_name}.dat"
+                difficulty_path = bs_map_output_dir / difficulty_filename
+
+                try:
+                    write_file_bytes(difficulty_path, difficulty_dat_payload)
+                    self.logger.info(f"Generated Beat Saber difficulty map: {difficulty_path}")
+
+                    # Add this difficulty to the info.dat structure
+                    difficulty_beatmaps.append({
+                        "_difficulty": bs_difficulty_name,
+                        "_difficultyRank": _DIFF_RANK[bs_difficulty_name],
+                        "_beatmapFilename": difficulty_filename,
+                        "_noteJumpMovementSpeed": 10, # Configurable later (often based on BPM/difficulty)
+                        "_noteJumpStartBeatOffset": 0,
+                        "_customData": {}
+                    })
+
+                except Exception as e:
+                    self.logger.error(f"Error writing difficulty .dat file {difficulty_path}: {e}")
+                    return False # Critical failure for this difficulty, stop conversion
+
+        # 7. Build and write info.dat once, now that every difficulty entry is known
+        info_dat_content = self._generate_info_dat(metadata, converted_audio_path.name, cover_filename, dominant_bpm, difficulty_beatmaps)
         info_dat_path = bs_map_output_dir / "info.dat"
         try:
-            with open(info_dat_path, 'w', encoding='utf-8') as f:
-                json.dump(info_dat_content, f, indent=4)
+            self._write_json(info_dat_path, info_dat_content)
             self.logger.info(f"Generated Beat Saber info.dat: {info_dat_path}")
         except Exception as e:
             self.logger.error(f"Error writing info.dat file {info_dat_path}: {e}")
             return False
 
-        self.logger.info(f"Beat Saber conversion completed successfully for {metadata.name} (with {len(difficulties_to_generate)} difficulties)!")
+        output_files = [converted_audio_path.name, *(entry["_beatmapFilename"] for entry in difficulty_beatmaps), "info.dat"]
+        if cover_filename:
+            output_files.append(cover_filename)
+        self._write_cache_key(bs_map_output_dir, cache_key, output_files)
+        self.logger.info(f"Beat Saber conversion completed successfully for {metadata.name} (with {len(difficulty_beatmaps)} difficulties)!")
         return True
 
+
 # Example Usage Block (now reflects full conversion workflow)
 if __name__ == "__main__":
     try:
         from PIL import Image # For dummy image
+        import mido
+        from mido import MidiFile
+        from mido.midifiles.tracks import MidiTrack # For testing MIDI creation
+        from pydub import AudioSegment
     except ImportError as e:
         print(f"\nSkipping example usage because a required library is not installed: {e}")
         print("Please ensure 'mido', 'pydub', and 'Pillow' are installed.")
         exit()
 
-    if MidiFile is None or AudioSegment is None:
-        print("\nSkipping example usage because essential libraries (mido/pydub) are not installed.")
-        exit()
-
     # --- Setup dummy config and directories ---
     temp_config_file = Path("temp_test_config_converter.json")
     if temp_config_file.exists():
@@ -535,14 +839,14 @@ if __name__ == "__main__":
     mid.ticks_per_beat = 480 # Standard for many MIDI files
 
     # Test with tempo changes and various notes
-    track.append(mido.Message('set_tempo', tempo=mido.bpm2tempo(120), time=0)) # 120 BPM
+    track.append(mido.MetaMessage('set_tempo', tempo=mido.bpm2tempo(120), time=0)) # 120 BPM
     track.append(mido.Message('note_on', note=60, velocity=64, time=0)) # Green note at Beat 0.0 (Left Saber)
     track.append(mido.Message('note_off', note=60, velocity=0, time=mid.ticks_per_beat // 2)) # Releases at Beat 0.5
 
     track.append(mido.Message('note_on', note=62, velocity=64, time=mid.ticks_per_beat // 2)) # Yellow note at Beat 1.0 (Right Saber)
     track.append(mido.Message('note_off', note=62, velocity=0, time=mid.ticks_per_beat // 2)) # Releases at Beat 1.5
 
-    track.append(mido.Message('set_tempo', tempo=mido.bpm2tempo(180), time=mid.ticks_per_beat)) # Change to 180 BPM after 1 beat at 120 (at total beat 2.5)
+    track.append(mido.MetaMessage('set_tempo', tempo=mido.bpm2tempo(180), time=mid.ticks_per_beat)) # Change to 180 BPM after 1 beat at 120 (at total beat 2.5)
     
     track.append(mido.Message('note_on', note=64, velocity=64, time=mid.ticks_per_beat // 2)) # Orange note at Beat 2.5 + 0.5 = 3.0 (at 180 BPM, Right Saber)
     track.append(mido.Message('note_off', note=64, velocity=0, time=0)) 
@@ -613,6 +917,7 @@ if __name__ == "__main__":
 
 
     # --- Cleanup ---
+    temp_config.flush() # Write pending settings now so nothing recreates the file at exit
     if temp_config_file.exists():
         temp_config_file.unlink()
     if output_base_dir_multi.exists():
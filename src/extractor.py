@@ -1,28 +1,149 @@
 # src/extractor.py
 
+import atexit
 import zipfile
-import configparser
+import ntpath
 import os
 import shutil
+import tempfile
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 import logging 
+from functools import lru_cache
+from operator import itemgetter
 
 from src.models import CloneHeroSongMetadata
 from src.config import AppConfig # Assuming config.py is in src/
 
+# The only ZIP members the converter can use; everything else (charts for other games, videos,
+# backgrounds, ...) is left in the archive instead of being written to disk.
+WANTED_FILENAMES = frozenset({"song.ini", "notes.mid"})
+AUDIO_EXTS = frozenset({".opus", ".ogg", ".wav", ".mp3"})
+IMAGE_EXTS = frozenset({".jpg", ".jpeg", ".png"})
+_WANTED_EXTS = AUDIO_EXTS | IMAGE_EXTS
+
+# Preferred names, tried in order before falling back to any file with a matching extension
+AUDIO_EXT_PRIORITY = ('.opus', '.ogg', '.wav', '.mp3') # Prioritize opus as per request
+COVER_IMAGE_NAMES = ('album.jpg', 'album.png', 'cover.jpg', 'cover.png') # common naming conventions
+IMAGE_EXT_PRIORITY = ('.jpg', '.jpeg', '.png')
+_AUDIO_RANK = {ext: rank for rank, ext in enumerate(AUDIO_EXT_PRIORITY)}
+_IMAGE_RANK = {ext: rank for rank, ext in enumerate(IMAGE_EXT_PRIORITY)}
+
+# song.ini keys holding a numeric difficulty per instrument
+DIFF_PREFIXES = frozenset({'diff_guitar', 'diff_bass', 'diff_drums', 'diff_keys',
+                           'diff_vocals', 'diff_band', 'diff_ghl_guitar', 'diff_ghl_bass', 'diff_rhythm'})
+
+EXTRACT_CHUNK_SIZE = 1 << 20 # Copy buffer for streaming ZIP members to disk
+
+# Directories this process has already created, so repeated Extractors skip the mkdir syscalls
+_DIRS_CREATED: set[str] = set()
+
+# Characters Windows forbids in file names; replaced like ZipFile.extract does on Windows
+_WINDOWS_ILLEGAL_NAME_CHARS = str.maketrans(':<>|"?*', '_______')
+
+def _sanitize_member_part(part: str) -> str:
+    """
+    Makes one ZIP member path component a valid file name on every platform (a local copy of
+    ZipFile._sanitize_windows_name), so e.g. "Artist - Title: Live" can still be extracted on Windows.
+    """
+    return part.translate(_WINDOWS_ILLEGAL_NAME_CHARS).rstrip('.')
+
+def _parse_ini_text(text: str) -> Dict[str, str]:
+    """
+    Parses the key = value lines of a song.ini's [song] section into a dict with lowercased keys.
+    Lines before the first section header also count as [song], so files missing the header
+    parse the same way; keys in any other section are ignored.
+    """
+    values = {}
+    in_song_section = True
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line[0] in ';#':
+            continue
+        if line[0] == '[':
+            in_song_section = line.strip('[]').strip().lower() == 'song'
+            continue
+        if in_song_section:
+            key, sep, value = line.partition('=')
+            if sep:
+                values[key.strip().lower()] = value.strip()
+    return values
+
+@lru_cache(maxsize=4096)
+def _parse_ini_cached(data: bytes) -> Tuple[Tuple[str, str], ...]:
+    """
+    Parses raw song.ini bytes, remembering the result so re-running a batch skips the parse.
+    Keyed on the file content rather than its path and mtime, since every extraction writes
+    the file to a fresh temp path with a new mtime. Returns immutable pairs; build a dict per use.
+    """
+    return tuple(_parse_ini_text(data.decode('utf-8-sig', errors='replace')).items()) # utf-8-sig drops a BOM
+
+def _iter_files(root: str | Path) -> Iterator[os.DirEntry]:
+    """
+    Yields a DirEntry for every file below root. Uses os.scandir's cached entry types, so unlike
+    os.walk it needs no extra stat calls and builds no per-directory name lists.
+    """
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file():
+                    yield entry
+
+class _FileIndex:
+    """All files under an extracted song folder, gathered in a single directory traversal."""
+
+    def __init__(self, folder_path: Path, files: Optional[Iterable[str]] = None):
+        """Indexes the given file path strings, or scans folder_path when files is None."""
+        if files is None:
+            files = [entry.path for entry in _iter_files(folder_path)]
+        self.folder_path = folder_path
+        self.by_name: Dict[str, Path] = {} # Lowercased file name -> shallowest file with that name
+        self.files: List[Path] = [] # Every file, shallowest first
+        # Files classified by type once, best format first (then shallowest), for the finder fallbacks
+        audio_files = []
+        image_files = []
+        # Work on plain strings and only build a Path per file once it is classified
+        for file in sorted(files, key=lambda f: f.count(os.sep)): # So shallower files win name clashes, like os.walk did
+            path = Path(file)
+            name = os.path.basename(file).lower()
+            suffix = os.path.splitext(name)[1]
+            self.files.append(path)
+            self.by_name.setdefault(name, path)
+            if suffix in AUDIO_EXTS:
+                audio_files.append((_AUDIO_RANK[suffix], path))
+            elif suffix in IMAGE_EXTS:
+                image_files.append((_IMAGE_RANK[suffix], path))
+        # Stable sorts on the rank alone, so depth order is kept per format
+        self.audio_files: List[Path] = [path for _, path in sorted(audio_files, key=itemgetter(0))]
+        self.image_files: List[Path] = [path for _, path in sorted(image_files, key=itemgetter(0))]
+
 class Extractor:
     def __init__(self, config: AppConfig):
         self.config = config
-        self.temp_extract_dir = Path("temp_extracted_songs") # Temporary directory for extraction
-        self.temp_extract_dir.mkdir(exist_ok=True) # Ensure it exists
         self.logger = logging.getLogger(__name__)
+        # Temporary directory for extraction. The system temp directory (honoring TMPDIR/TMP) is
+        # often RAM-backed, so extracted files that are only read once never hit the disk.
+        temp_root = config.temp_directory
+        if temp_root is not None and str(temp_root) not in _DIRS_CREATED:
+            os.makedirs(temp_root, exist_ok=True)
+            _DIRS_CREATED.add(str(temp_root))
+        self._temp_dir_str = tempfile.mkdtemp(prefix='ch2bs_', dir=temp_root)
+        self.temp_extract_dir = Path(self._temp_dir_str)
+        atexit.register(self._clean_temp_root) # Also covers songs whose cleanup was skipped by an error
+
+    def _clean_temp_root(self):
+        """Removes the whole extraction directory at exit, unless temp files are to be kept."""
+        if self.config.delete_temp_files:
+            shutil.rmtree(self.temp_extract_dir, ignore_errors=True)
 
     def _clean_temp_dir(self, path: Path):
         """Removes the temporary directory after processing."""
         if path.exists() and self.config.delete_temp_files:
             shutil.rmtree(path)
-            self.logger.info(f"Cleaned up temporary directory: {path}")
+            self.logger.info("Cleaned up temporary directory: %s", path)
 
     def extract_and_parse(self, zip_filepath: Path) -> Optional[CloneHeroSongMetadata]:
         """
@@ -30,76 +151,102 @@ class Extractor:
         Returns a CloneHeroSongMetadata object or None on failure.
         """
         if not zip_filepath.exists():
-            self.logger.error(f"Error: ZIP file not found at {zip_filepath}")
+            self.logger.error("Error: ZIP file not found at %s", zip_filepath)
             return None
 
-        # Create a unique temporary directory for this song
-        song_temp_dir = self.temp_extract_dir / zip_filepath.stem
-        song_temp_dir.mkdir(exist_ok=True)
+        # Create a unique temporary directory for this song, so concurrent extractions of
+        # same-named ZIPs (or a retry of one still being cleaned up) never share a folder
+        song_temp_dir = Path(tempfile.mkdtemp(prefix=f"{zip_filepath.stem}_", dir=self._temp_dir_str))
 
         try:
             with zipfile.ZipFile(zip_filepath, 'r') as zip_ref:
-                zip_ref.extractall(song_temp_dir)
-            self.logger.info(f"Extracted {zip_filepath.name} to {song_temp_dir}")
+                file_index = self._extract_wanted_members(zip_ref, song_temp_dir)
+            self.logger.debug("Extracted %d file(s) from %s to %s", len(file_index.files), zip_filepath.name, song_temp_dir)
 
-            metadata = self._parse_extracted_folder(song_temp_dir)
+            metadata = self._parse_extracted_folder(song_temp_dir, file_index)
             if metadata:
-                self.logger.info(f"Successfully parsed metadata for {metadata.name}")
-                metadata.midi_path = self._find_file(song_temp_dir, "notes.mid")
-                metadata.audio_path = self._find_audio_file(song_temp_dir)
-                metadata.cover_path = self._find_cover_image(song_temp_dir)
+                self.logger.debug("Successfully parsed metadata for %s", metadata.name)
+                metadata.midi_path = self._find_file(file_index, "notes.mid")
+                metadata.audio_path = self._find_audio_file(file_index)
+                metadata.cover_path = self._find_cover_image(file_index)
                 
                 # Assign the temporary directory for cleanup later if needed
                 metadata._temp_dir = song_temp_dir 
                 return metadata
             else:
-                self.logger.warning(f"Could not parse song.ini or find essential files in {song_temp_dir}")
+                self.logger.warning("Could not parse song.ini or find essential files in %s", song_temp_dir)
                 self._clean_temp_dir(song_temp_dir)
                 return None
 
         except zipfile.BadZipFile:
-            self.logger.error(f"Error: {zip_filepath.name} is not a valid ZIP file.")
+            self.logger.error("Error: %s is not a valid ZIP file.", zip_filepath.name)
             self._clean_temp_dir(song_temp_dir)
             return None
         except Exception as e:
-            self.logger.error(f"An unexpected error occurred during extraction or parsing: {e}")
+            self.logger.error("An unexpected error occurred during extraction or parsing: %s", e)
             self._clean_temp_dir(song_temp_dir)
             return None
 
-    def _parse_extracted_folder(self, folder_path: Path) -> Optional[CloneHeroSongMetadata]:
+    def _extract_wanted_members(self, zip_ref: zipfile.ZipFile, song_temp_dir: Path) -> _FileIndex:
+        """
+        Extracts only the members the converter uses (song.ini, notes.mid, audio and images)
+        and returns an index of the extracted files, so they never have to be searched for on disk.
+        """
+        song_dir = os.path.abspath(song_temp_dir)
+        created_dirs = {song_dir} # mkdtemp made the song folder; only create each subfolder once
+        extracted = []
+        for info in zip_ref.infolist():
+            if info.is_dir():
+                continue
+            # Split on both separators, as ZipFile.extract does on Windows
+            raw_parts = info.filename.replace('\\', '/').split('/')
+            name = raw_parts[-1].lower()
+            if name not in WANTED_FILENAMES and os.path.splitext(name)[1] not in _WANTED_EXTS:
+                continue
+            # Zip-Slip guard: never write outside the song's temporary directory. Drive-qualified
+            # parts ("C:", "C:evil") are rejected since ntpath.join restarts the path at them.
+            if info.filename.startswith(("/", "\\")) or ".." in raw_parts or any(ntpath.splitdrive(part)[0] for part in raw_parts):
+                self.logger.warning("Warning: Skipping unsafe ZIP member path: %s", info.filename)
+                continue
+            parts = [part for part in map(_sanitize_member_part, raw_parts) if part and part != '.']
+            if not parts:
+                continue
+            dest_path = os.path.join(song_dir, *parts)
+            if os.path.commonpath([song_dir, os.path.abspath(dest_path)]) != song_dir:
+                self.logger.warning("Warning: Skipping unsafe ZIP member path: %s", info.filename)
+                continue
+            dest_dir = os.path.dirname(dest_path)
+            if dest_dir not in created_dirs:
+                os.makedirs(dest_dir, exist_ok=True)
+                created_dirs.add(dest_dir)
+            # Stream in 1 MiB chunks rather than extract()'s 8 KiB; no flush/fsync per file
+            with zip_ref.open(info) as src, open(dest_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst, length=EXTRACT_CHUNK_SIZE)
+            extracted.append(dest_path)
+        return _FileIndex(song_temp_dir, extracted)
+
+    def _parse_extracted_folder(self, folder_path: Path, file_index: Optional[_FileIndex] = None) -> Optional[CloneHeroSongMetadata]:
         """
         Parses the song.ini file within an extracted Clone Hero song folder.
+        Pass the folder's file index when one is at hand, otherwise the folder is scanned.
         """
-        song_ini_path = folder_path / "song.ini"
-        if not song_ini_path.exists():
-            # Sometimes song.ini might be nested, try to find it
-            for root, _, files in os.walk(folder_path):
-                if "song.ini" in files:
-                    song_ini_path = Path(root) / "song.ini"
-                    break
-            if not song_ini_path.exists():
-                self.logger.error(f"Error: song.ini not found in {folder_path}")
-                return None
+        warn = self.logger.warning
+        if file_index is None:
+            file_index = _FileIndex(folder_path)
+        # Shallowest song.ini wins; it is sometimes nested in a subfolder
+        song_ini_path = file_index.by_name.get("song.ini")
+        if song_ini_path is None:
+            self.logger.error("Error: song.ini not found in %s", folder_path)
+            return None
 
-        config_parser = configparser.ConfigParser()
-        # configparser is case-insensitive by default for section/option names.
-        # Ensure it reads the raw casing if needed, but for song.ini, it's usually fine.
         try:
-            config_parser.read(song_ini_path, encoding='utf-8')
-        except configparser.MissingSectionHeaderError:
-            self.logger.error(f"Error: Missing section header in {song_ini_path}. Attempting to add a default [song] section.")
-            with open(song_ini_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            with open(song_ini_path, 'w', encoding='utf-8') as f:
-                f.write("[song]\n" + content)
-            config_parser.read(song_ini_path, encoding='utf-8')
-        except Exception as e:
-            self.logger.error(f"Error reading song.ini at {song_ini_path}: {e}")
+            song_section = dict(_parse_ini_cached(song_ini_path.read_bytes()))
+        except OSError as e:
+            self.logger.error("Error reading song.ini at %s: %s", song_ini_path, e)
             return None
 
         metadata = CloneHeroSongMetadata()
-        if 'song' in config_parser:
-            song_section = config_parser['song']
+        if song_section:
             metadata.name = song_section.get('name', "Unknown Song")
             metadata.artist = song_section.get('artist', "Unknown Artist")
             metadata.album = song_section.get('album')
@@ -108,78 +255,68 @@ class Extractor:
             metadata.charter = song_section.get('charter', song_section.get('frets')) # 'frets' is an older tag for charter
             
             # Parse numeric fields
-            metadata.preview_start_time = self._parse_int(song_section, 'preview_start_time', 0)
-            metadata.song_length = self._parse_int(song_section, 'song_length')
-
-            # Parse difficulties
-            diff_prefixes = ['diff_guitar', 'diff_bass', 'diff_drums', 'diff_keys',
-                             'diff_vocals', 'diff_band', 'diff_ghl_guitar', 'diff_ghl_bass', 'diff_rhythm']
-            for prefix in diff_prefixes:
-                if prefix in song_section:
+            value = song_section.get('preview_start_time')
+            if value is not None:
+                try:
+                    metadata.preview_start_time = int(value)
+                except ValueError:
+                    warn("Warning: Could not parse 'preview_start_time' as integer (value: '%s')", value)
+            value = song_section.get('song_length')
+            if value is not None:
+                try:
+                    metadata.song_length = int(value)
+                except ValueError:
+                    warn("Warning: Could not parse 'song_length' as integer (value: '%s')", value)
+
+            # Parse difficulties, in a single pass over the song's own keys
+            for key, value in song_section.items():
+                if key in DIFF_PREFIXES:
                     try:
-                        metadata.difficulties[prefix] = int(song_section[prefix])
-                    except ValueError:
-                        self.logger.warning(f"Warning: Invalid difficulty value for {prefix} in {song_ini_path}")
+                        metadata.difficulties[key] = int(value, 10)
+                    except (ValueError, TypeError):
+                        warn("Warning: Invalid difficulty value for %s in %s", key, song_ini_path)
         else:
-            self.logger.warning(f"Warning: '[song]' section not found in {song_ini_path}. Metadata might be incomplete.")
+            warn("Warning: No song settings found in %s. Metadata might be incomplete.", song_ini_path)
         
         return metadata
 
-    def _parse_int(self, section, key, default=None):
-        """Helper to safely parse an integer from a config section."""
-        value = section.get(key)
-        if value is not None:
-            try:
-                return int(value)
-            except ValueError:
-                self.logger.warning(f"Warning: Could not parse '{key}' as integer (value: '{value}')")
-        return default
-
-    def _find_file(self, folder_path: Path, filename: str) -> Optional[Path]:
-        """Finds a specific file, potentially nested."""
-        for root, _, files in os.walk(folder_path):
-            if filename in files:
-                return Path(root) / filename
-        self.logger.warning(f"Warning: {filename} not found in {folder_path}")
-        return None
+    def _find_file(self, file_index: _FileIndex, filename: str, warn: bool = True) -> Optional[Path]:
+        """Finds a specific file, potentially nested. Names are matched case-insensitively."""
+        found_file = file_index.by_name.get(filename.lower())
+        if found_file is None and warn:
+            self.logger.warning("Warning: %s not found in %s", filename, file_index.folder_path)
+        return found_file
 
-    def _find_audio_file(self, folder_path: Path) -> Optional[Path]:
+    def _find_audio_file(self, file_index: _FileIndex) -> Optional[Path]:
         """Finds the audio file, preferring .opus then common audio formats."""
-        audio_extensions = ['.opus', '.ogg', '.wav', '.mp3'] # Prioritize opus as per request
-        for ext in audio_extensions:
-            found_file = self._find_file(folder_path, f"song{ext}") # common naming convention
+        for ext in AUDIO_EXT_PRIORITY:
+            found_file = self._find_file(file_index, f"song{ext}", warn=False) # common naming convention
             if found_file:
                 return found_file
         
-        # Fallback: search for any audio file
-        for root, _, files in os.walk(folder_path):
-            for file in files:
-                if any(file.endswith(ext) for ext in audio_extensions):
-                    return Path(root) / file
-        self.logger.warning(f"Warning: No supported audio file found in {folder_path}")
+        # Fallback: any audio file, still preferring the formats in AUDIO_EXT_PRIORITY order
+        if file_index.audio_files:
+            return file_index.audio_files[0]
+        self.logger.warning("Warning: No supported audio file found in %s", file_index.folder_path)
         return None
 
-    def _find_cover_image(self, folder_path: Path) -> Optional[Path]:
+    def _find_cover_image(self, file_index: _FileIndex) -> Optional[Path]:
         """Finds the cover image, preferring .jpg then other common image formats."""
-        image_names = ['album.jpg', 'album.png', 'cover.jpg', 'cover.png'] # common naming conventions
-        for name in image_names:
-            found_file = self._find_file(folder_path, name)
+        for name in COVER_IMAGE_NAMES:
+            found_file = self._find_file(file_index, name, warn=False)
             if found_file:
                 return found_file
         
-        # Fallback: search for any image file (less specific)
-        image_extensions = ['.jpg', '.jpeg', '.png']
-        for root, _, files in os.walk(folder_path):
-            for file in files:
-                if any(file.endswith(ext) for ext in image_extensions):
-                    return Path(root) / file
-        self.logger.warning(f"Warning: No supported cover image found in {folder_path}")
+        # Fallback: any image file (less specific), preferring .jpg
+        if file_index.image_files:
+            return file_index.image_files[0]
+        self.logger.warning("Warning: No supported cover image found in %s", file_index.folder_path)
         return None
 
     # This method will be implemented in the converter module, but we can call it here for cleanup.
     def cleanup_temp_files(self, song_metadata: CloneHeroSongMetadata):
         """Removes temporary files associated with a processed song."""
-        if hasattr(song_metadata, '_temp_dir'):
+        if song_metadata._temp_dir is not None:
             self._clean_temp_dir(song_metadata._temp_dir)
 
 
@@ -1,13 +1,11 @@
 # src/main.py
 
-import customtkinter as ctk
 import logging # Import logging
 from pathlib import Path # For log file path
 
 from src.config import AppConfig
 from src.extractor import Extractor
 from src.converter import Converter
-from src.ui import AppUI
 from src.utils import setup_logging # Import setup_logging
 
 def main():
@@ -18,10 +16,14 @@ def main():
     logger = logging.getLogger(__name__) # Get logger for this module
     logger.info("Application starting...")
 
+    # The GUI toolkit (Tk, Pillow) is slow to import, so only load it once the GUI is actually starting
+    import customtkinter as ctk
+    from src.ui import AppUI
+
     ctk.set_appearance_mode("System")
     ctk.set_default_color_theme("blue")
 
-    config = AppConfig()
+    config = AppConfig.instance()
     extractor = Extractor(config)
     converter = Converter(config)
 
@@ -4,7 +4,7 @@ from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Optional, Dict
 
-@dataclass
+@dataclass(slots=True)
 class CloneHeroSongMetadata:
     name: str = "Unknown Song"
     artist: str = "Unknown Artist"
@@ -21,7 +21,10 @@ class CloneHeroSongMetadata:
     audio_path: Optional[Path] = None
     cover_path: Optional[Path] = None
 
-@dataclass
+    # Temporary extraction folder, set by the Extractor and removed by Extractor.cleanup_temp_files
+    _temp_dir: Optional[Path] = None
+
+@dataclass(slots=True)
 class BeatSaberMapData:
     song_name: str
     song_artist: str
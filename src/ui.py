@@ -4,14 +4,19 @@ import customtkinter as ctk
 from tkinter import filedialog, messagebox
 from pathlib import Path
 import threading # For running conversion in a separate thread
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import os
-from typing import Optional
+from typing import Optional, Tuple
 
 from src.config import AppConfig
 from src.extractor import Extractor
 from src.converter import Converter
 from src.models import CloneHeroSongMetadata # Needed for type hints in UI
 
+STATUS_POLL_MS = 50 # How often queued status updates are drawn
+ERROR_HOLD_MS = 3000 # How long an error stays on screen before routine updates replace it
 
 class AppUI(ctk.CTk):
     def __init__(self, config: AppConfig, extractor: Extractor, converter: Converter):
@@ -26,8 +31,14 @@ class AppUI(ctk.CTk):
         self.grid_columnconfigure(0, weight=1)
         self.grid_rowconfigure(2, weight=1) # Allow scrollable frame to expand
 
+        # Status updates from any thread, applied by the main thread every STATUS_POLL_MS (see _drain_status_queue)
+        self._status_queue: queue.Queue = queue.Queue()
+        self._pending_status: Optional[Tuple[str, str, float]] = None # Latest routine message held back by an error
+        self._error_hold_until = 0.0 # time.monotonic() until which a shown error isn't replaced
+
         self._create_widgets()
         self._load_current_settings()
+        self.after(STATUS_POLL_MS, self._drain_status_queue)
 
     def _create_widgets(self):
         # --- Frame for ZIP selection ---
@@ -43,10 +54,10 @@ class AppUI(ctk.CTk):
         
         # Listbox to display selected ZIPs
         ctk.CTkLabel(self.zip_frame, text="Selected ZIP Files:").grid(row=1, column=0, padx=5, pady=2, sticky="w")
-        self.zip_list_frame = ctk.CTkScrollableFrame(self.zip_frame, height=100)
-        self.zip_list_frame.grid(row=2, column=0, columnspan=3, padx=5, pady=5, sticky="ew")
+        # A single read-only textbox rather than a label per ZIP, so layout cost doesn't grow with the selection
+        self.zip_list_textbox = ctk.CTkTextbox(self.zip_frame, height=100, wrap="none")
+        self.zip_list_textbox.grid(row=2, column=0, columnspan=3, padx=5, pady=5, sticky="ew")
         self.selected_zip_paths = [] # Store Path objects
-        self.zip_labels = [] # To hold references to CtkLabels in the scrollable frame
         self.update_zip_list_display()
 
 
@@ -77,9 +88,9 @@ class AppUI(ctk.CTk):
         # Difficulty mapping display (read-only for now, could be editable later)
         ctk.CTkLabel(self.config_frame, text="Difficulty Mapping (CH numeric -> BS):", anchor="w").grid(row=3, column=0, columnspan=3, padx=5, pady=5, sticky="ew")
         
-        # Scrollable frame for difficulty mapping
-        self.difficulty_map_scroll_frame = ctk.CTkScrollableFrame(self.config_frame, height=80)
-        self.difficulty_map_scroll_frame.grid(row=4, column=0, columnspan=3, padx=5, pady=5, sticky="ew")
+        # Read-only textbox for difficulty mapping
+        self.difficulty_map_textbox = ctk.CTkTextbox(self.config_frame, height=80, wrap="none")
+        self.difficulty_map_textbox.grid(row=4, column=0, columnspan=3, padx=5, pady=5, sticky="ew")
         self._update_difficulty_map_display()
         
         self.save_config_button = ctk.CTkButton(self.config_frame, text="Save Settings", command=self._save_settings)
@@ -121,33 +132,36 @@ class AppUI(ctk.CTk):
         if not new_output_dir.exists():
             try:
                 new_output_dir.mkdir(parents=True, exist_ok=True)
-                self.config.set_setting("output_directory", str(new_output_dir))
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to create output directory: {e}")
                 self._update_status(f"Error: Failed to create output directory: {e}", "red")
                 return
-        else:
-            self.config.set_setting("output_directory", str(new_output_dir))
+        self.config.update_settings({
+            "output_directory": str(new_output_dir),
+            "audio_target_format": self.audio_format_optionmenu.get(),
+            "delete_temp_files": self.delete_temp_checkbox.get() == 1,
+        })
+        self.config.flush()
 
-        self.config.set_setting("audio_target_format", self.audio_format_optionmenu.get())
-        self.config.set_setting("delete_temp_files", self.delete_temp_checkbox.get() == 1)
-        
         messagebox.showinfo("Settings Saved", "Application settings have been saved.")
         self._update_status("Settings saved successfully.", "green")
 
-    def _update_difficulty_map_display(self):
-        """Clears and repopulates the difficulty mapping display."""
-        # Clear existing labels
-        for widget in self.difficulty_map_scroll_frame.winfo_children():
-            widget.destroy()
+    def _set_textbox_text(self, textbox: ctk.CTkTextbox, text: str):
+        """Replaces the contents of a read-only textbox."""
+        textbox.configure(state="normal")
+        textbox.delete("1.0", "end")
+        textbox.insert("1.0", text)
+        textbox.configure(state="disabled")
 
+    def _update_difficulty_map_display(self):
+        """Repopulates the difficulty mapping display."""
         mapping = self.config.difficulty_mapping
         if not mapping:
-            ctk.CTkLabel(self.difficulty_map_scroll_frame, text="No difficulty mapping configured.").pack(anchor="w")
+            self._set_textbox_text(self.difficulty_map_textbox, "No difficulty mapping configured.")
             return
-        
-        for ch_diff, bs_diff in mapping.items():
-            ctk.CTkLabel(self.difficulty_map_scroll_frame, text=f"CH {ch_diff} -> BS {bs_diff}").pack(anchor="w", padx=2, pady=1)
+
+        self._set_textbox_text(self.difficulty_map_textbox,
+                               "\n".join(f"CH {ch_diff} -> BS {bs_diff}" for ch_diff, bs_diff in mapping.items()))
 
     def _browse_zips(self):
         """Opens a file dialog to select one or more Clone Hero ZIP files."""
@@ -162,20 +176,12 @@ class AppUI(ctk.CTk):
             self.zip_entry.insert(0, f"{len(self.selected_zip_paths)} ZIP(s) selected")
 
     def update_zip_list_display(self):
-        """Updates the scrollable frame with selected ZIP files."""
-        for label in self.zip_labels:
-            label.destroy()
-        self.zip_labels.clear()
-
+        """Updates the ZIP list textbox with the selected ZIP files."""
         if not self.selected_zip_paths:
-            label = ctk.CTkLabel(self.zip_list_frame, text="No ZIP files selected.")
-            label.pack(anchor="w", padx=2, pady=1)
-            self.zip_labels.append(label)
+            self._set_textbox_text(self.zip_list_textbox, "No ZIP files selected.")
         else:
-            for i, zip_path in enumerate(self.selected_zip_paths):
-                label = ctk.CTkLabel(self.zip_list_frame, text=f"{i+1}. {zip_path.name}", wraplength=700)
-                label.pack(anchor="w", padx=2, pady=1)
-                self.zip_labels.append(label)
+            self._set_textbox_text(self.zip_list_textbox,
+                                   "\n".join(f"{i+1}. {zip_path.name}" for i, zip_path in enumerate(self.selected_zip_paths)))
 
     def _browse_output_dir(self):
         """Opens a directory dialog to select the output folder."""
@@ -184,13 +190,45 @@ class AppUI(ctk.CTk):
             self.output_dir_entry.delete(0, ctk.END)
             self.output_dir_entry.insert(0, output_dir)
             self.config.set_setting("output_directory", output_dir) # Update config directly
+            self.config.flush()
 
     def _update_status(self, message: str, color: str = "white", progress: float = -1.0):
-        """Updates the status label and optionally the progress bar."""
-        self.status_label.configure(text=message, text_color=color)
+        """
+        Queues an update of the status label and optionally the progress bar.
+        Safe to call from any thread; the widgets are only touched by _drain_status_queue.
+        """
+        self._status_queue.put((message, color, progress))
+
+    def _drain_status_queue(self):
+        """
+        Applies queued status updates on the Tk main thread, then reschedules itself.
+        Routine messages and progress are coalesced to the latest one, so bursts of updates cost one redraw.
+        Error (red) messages always win over routine ones and stay up for ERROR_HOLD_MS, so a failure
+        reported by one worker isn't overwritten by another worker's progress before it can be read.
+        """
+        error = None
+        progress = -1.0
+        try:
+            while True:
+                item = self._status_queue.get_nowait()
+                if item[2] >= 0:
+                    progress = item[2]
+                if item[1] == "red":
+                    error = item
+                else:
+                    self._pending_status = item
+        except queue.Empty:
+            pass
+        now = time.monotonic()
+        if error is not None:
+            self.status_label.configure(text=error[0], text_color=error[1])
+            self._error_hold_until = now + ERROR_HOLD_MS / 1000
+        elif self._pending_status is not None and now >= self._error_hold_until:
+            self.status_label.configure(text=self._pending_status[0], text_color=self._pending_status[1])
+            self._pending_status = None
         if progress >= 0:
             self.progress_bar.set(progress)
-        self.update_idletasks() # Refresh UI
+        self.after(STATUS_POLL_MS, self._drain_status_queue)
 
     def _start_conversion_thread(self):
         """Starts the conversion process in a separate thread to keep UI responsive."""
@@ -210,50 +248,68 @@ class AppUI(ctk.CTk):
         conversion_thread.start()
 
     def _run_conversion(self):
-        """The actual conversion logic, run in a separate thread."""
-        total_zips = len(self.selected_zip_paths)
+        """
+        The actual conversion logic, run in a separate thread. Songs are processed concurrently,
+        since extraction and conversion mostly wait on disk I/O or ffmpeg.
+        """
+        zip_paths = list(self.selected_zip_paths)
+        total_zips = len(zip_paths)
         successful_conversions = 0
 
-        for i, zip_path in enumerate(self.selected_zip_paths):
-            current_progress = (i / total_zips) * 0.9 # Allocate 90% for individual file processing
-            self._update_status(f"Processing ({i+1}/{total_zips}): {zip_path.name}", "white", current_progress)
-
-            metadata: Optional[CloneHeroSongMetadata] = None
-            try:
-                # 1. Extract and Parse
-                self._update_status(f"Extracting & parsing {zip_path.name}...", "white", current_progress + 0.02)
-                metadata = self.extractor.extract_and_parse(zip_path)
-                if not metadata:
-                    raise ValueError(f"Failed to extract or parse {zip_path.name}")
-
-                # 2. Convert to Beat Saber
-                self._update_status(f"Converting {metadata.name} to Beat Saber format...", "white", current_progress + 0.05)
-                success = self.converter.convert_to_beatsaber(metadata)
-                if not success:
-                    raise ValueError(f"Failed to convert {metadata.name} to Beat Saber format.")
-
-                successful_conversions += 1
-                self._update_status(f"Successfully converted: {metadata.name}", "green", (i + 1) / total_zips * 0.9)
-
-            except Exception as e:
-                self._update_status(f"Error converting {zip_path.name}: {e}", "red")
-                print(f"Detailed error for {zip_path.name}: {e}") # Log detailed error to console
-            finally:
-                # Clean up temporary files regardless of conversion success for this song
-                if metadata and hasattr(metadata, '_temp_dir'):
-                    self.extractor.cleanup_temp_files(metadata)
-
-
+        workers = min(8, os.cpu_count() or 4, total_zips)
+        # With several songs transcoding at once, keep each ffmpeg single-threaded so the
+        # total thread count stays bounded by the pool size.
+        self.converter.ffmpeg_threads = 1 if workers > 1 else None
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(self._process_one, zip_path) for zip_path in zip_paths]
+            for done, future in enumerate(as_completed(futures), start=1):
+                zip_path, success, error = future.result()
+                current_progress = done / total_zips * 0.9 # Allocate 90% for individual file processing
+                if success:
+                    successful_conversions += 1
+                    self._update_status(f"Successfully converted ({done}/{total_zips}): {zip_path.name}", "green", current_progress)
+                else:
+                    self._update_status(f"Error converting {zip_path.name}: {error}", "red", current_progress)
+
+        self.after(0, self._finish_conversion, successful_conversions, total_zips)
+
+    def _process_one(self, zip_path: Path) -> Tuple[Path, bool, Optional[str]]:
+        """Extracts and converts a single ZIP on a worker thread. Returns (zip_path, success, error message)."""
+        metadata: Optional[CloneHeroSongMetadata] = None
+        try:
+            # 1. Extract and Parse
+            self._update_status(f"Extracting & parsing {zip_path.name}...", "white")
+            metadata = self.extractor.extract_and_parse(zip_path)
+            if not metadata:
+                raise ValueError(f"Failed to extract or parse {zip_path.name}")
+
+            # 2. Convert to Beat Saber
+            self._update_status(f"Converting {metadata.name} to Beat Saber format...", "white")
+            success = self.converter.convert_to_beatsaber(metadata)
+            if not success:
+                raise ValueError(f"Failed to convert {metadata.name} to Beat Saber format.")
+            return zip_path, True, None
+
+        except Exception as e:
+            print(f"Detailed error for {zip_path.name}: {e}") # Log detailed error to console
+            return zip_path, False, str(e)
+        finally:
+            # Clean up temporary files regardless of conversion success for this song
+            if metadata and metadata._temp_dir is not None:
+                self.extractor.cleanup_temp_files(metadata)
+
+    def _finish_conversion(self, successful_conversions: int, total_zips: int):
+        """Reports the batch result and re-enables the UI. Runs on the Tk main thread."""
         final_status_message = f"Conversion finished. {successful_conversions}/{total_zips} songs converted successfully."
         if successful_conversions < total_zips:
             messagebox.showwarning("Conversion Complete with Warnings", final_status_message)
-            self._update_status(final_status_message, "orange", 1.0)
+            self._update_status(final_status_message, "orange", 0) # Progress bar resets after completion
         else:
             messagebox.showinfo("Conversion Complete", final_status_message)
-            self._update_status(final_status_message, "green", 1.0)
+            self._update_status(final_status_message, "green", 0)
 
         self.start_button.configure(state="normal", text="Start Conversion")
-        self.progress_bar.set(0) # Reset progress bar after completion
 
 # If you want to test the UI standalone without main.py, uncomment the following:
 # if __name__ == "__main__":
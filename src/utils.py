@@ -1,8 +1,19 @@
 # src/utils.py
 
+import json
 import logging
+import os
 from pathlib import Path
-from typing import Optional
+from typing import Any, Optional
+
+# orjson is an optional, C-accelerated drop-in for the json module.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Directories this process has already created, so repeated setup calls skip the mkdir syscalls
+_DIRS_CREATED: set[str] = set()
 
 def setup_logging(log_file: Optional[Path] = None, level=logging.INFO):
     """
@@ -25,7 +36,9 @@ def setup_logging(log_file: Optional[Path] = None, level=logging.INFO):
 
         if log_file:
             # Ensure the log directory exists
-            log_file.parent.mkdir(parents=True, exist_ok=True)
+            if str(log_file.parent) not in _DIRS_CREATED:
+                log_file.parent.mkdir(parents=True, exist_ok=True)
+                _DIRS_CREATED.add(str(log_file.parent))
             
             # File handler
             file_handler = logging.FileHandler(log_file, encoding='utf-8')
@@ -36,6 +49,38 @@ def setup_logging(log_file: Optional[Path] = None, level=logging.INFO):
 
     logging.info("Logging setup complete.")
 
+def json_loads(data: bytes) -> Any:
+    """Parses JSON from raw bytes, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def json_dumps(obj: Any, pretty: bool = False) -> bytes:
+    """
+    Serializes obj to UTF-8 encoded JSON bytes, using orjson when it is installed.
+    Output is compact unless pretty is set, in which case it is indented by 2 spaces.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0)
+    if pretty:
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+def write_file_bytes(path: Path | str, data: bytes, durable: bool = False):
+    """
+    Writes data to path with raw os.write calls, bypassing Python's buffered/text file layers.
+    A payload this size is normally handed to the kernel in a single write(). Only fsyncs when durable is set.
+    """
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+        if durable:
+            os.fsync(fd)
+    finally:
+        os.close(fd)
+
 # You can add other utility functions here as they become apparent
 # For example, a more robust file cleaner than simple shutil.rmtree for specific patterns
 # def safe_delete_directory(path: Path):